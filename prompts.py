@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Prompts - Shared system prompt and output schemas for the scheduler
+
+Copyright (C) 2024 Task Prioritizer Contributors
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from functools import lru_cache
+from typing import Optional
+
+# Bump whenever STATIC_SYSTEM_PROMPT changes so cached schedules are invalidated
+PROMPT_VERSION = 5
+
+# When the workday ends unless the caller says otherwise (24h HH:MM)
+DEFAULT_END_TIME = "23:00"
+
+# A terse zero-shot prompt: only the rules that change the schedule are kept.
+# The output format is enforced by SCHEDULE_SCHEMA, so it isn't restated here.
+# It is deliberately free of interpolation: the bytes are identical on every call,
+# so the provider's prompt-prefix cache can reuse it. The date and time are sent
+# separately after it, from CONTEXT_TEMPLATE. Use build_system_prompt() to get
+# the full system message.
+STATIC_SYSTEM_PROMPT = """You turn a user's unstructured to-do list into a JSON schedule for the rest of today.
+Rules:
+- Schedule from the current time (given below) until the workday end time (given after these rules).
+- Prioritize tasks due soonest or marked for today.
+- Use 60-90 min blocks for demanding tasks, shorter blocks for minor ones.
+- Put 15 min breaks between tasks and at least one long break (e.g. dinner).
+- Make task_name descriptive and include any deadline, e.g. "Work on Presentation (Due Sep 26th)".
+- Dates are YYYY-MM-DD and times are 24h HH:MM."""
+
+@lru_cache(maxsize=None)
+def build_system_prompt(end_time: Optional[str] = None) -> str:
+    """
+    The system message for a given workday end time.
+    Every variant starts with the same STATIC_SYSTEM_PROMPT bytes, so they all share
+    one provider-side prefix cache entry; only the short suffix differs.
+    """
+    return f"{STATIC_SYSTEM_PROMPT}\nThe workday ends at {end_time or DEFAULT_END_TIME}."
+
+# The only per-call part of the prompt; filled in with str.format(date=..., time=...)
+CONTEXT_TEMPLATE = "Current Context: date {date}, time {time}"
+
+# Enforced server-side through structured outputs, so the schema costs no prompt tokens
+SCHEDULE_SCHEMA = {
+    "name": "schedule",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "schedule_date": {"type": "string"},
+            "tasks": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "task_name": {"type": "string"},
+                        "start_time": {"type": "string"},
+                        "end_time": {"type": "string"},
+                        "duration_minutes": {"type": "integer"}
+                    },
+                    "required": ["task_name", "start_time", "end_time", "duration_minutes"],
+                    "additionalProperties": False
+                }
+            }
+        },
+        "required": ["schedule_date", "tasks"],
+        "additionalProperties": False
+    }
+}
+
+# Extra instruction for requests that pack several task lists together
+MARSHALED_PROMPT = (
+    "The user message holds several independent to-do lists, each under a '### INPUT <id>' header. "
+    "Schedule each list on its own and return one entry per input, tagged with its id."
+)
+
+MULTI_SCHEDULE_SCHEMA = {
+    "name": "schedules",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "schedules": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "id": {"type": "integer"},
+                        **SCHEDULE_SCHEMA["schema"]["properties"]
+                    },
+                    "required": ["id"] + SCHEDULE_SCHEMA["schema"]["required"],
+                    "additionalProperties": False
+                }
+            }
+        },
+        "required": ["schedules"],
+        "additionalProperties": False
+    }
+}
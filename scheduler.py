@@ -19,114 +19,740 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 import os
-import json
+import re
+import sys
+import orjson
+import asyncio
+import hashlib
+import math
+import operator
+import sqlite3
+import time
+import weakref
 import argparse
-from openai import OpenAI, OpenAIError
+import httpx
+from array import array
+from typing import Callable, Dict, List, Optional
+from openai import AsyncOpenAI, OpenAI, OpenAIError, RateLimitError
 from datetime import datetime
 from dotenv import load_dotenv
+from pydantic import BaseModel
+from prompts import (
+    CONTEXT_TEMPLATE,
+    DEFAULT_END_TIME,
+    MARSHALED_PROMPT,
+    MULTI_SCHEDULE_SCHEMA,
+    PROMPT_VERSION,
+    SCHEDULE_SCHEMA,
+    build_system_prompt,
+)
 
-# Load environment variables from the .env file
-load_dotenv()
-
-# Initialize the OpenAI client lazily to avoid import-time failures
+# Initialize the OpenAI clients lazily to avoid import-time failures,
+# and so importing this module (e.g. in tests or for --help) stays cheap
 client = None
+# One asyncio client per event loop: its pooled connections belong to the loop that
+# opened them, so a client can't be reused after that loop (e.g. asyncio.run) ends
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+_env_loaded = False
+
+# Keep-alive pool with HTTP/2, so repeated and concurrent requests reuse one
+# TLS connection instead of each paying for a new handshake
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=40)
+HTTP_TIMEOUT = httpx.Timeout(60, connect=5)
+# The SDK retries rate limits (429), 5xx and connection errors itself, with jittered
+# exponential backoff that honors Retry-After. Only fatal errors reach our code.
+MAX_RETRIES = 5
+
+def _load_env():
+    """Load environment variables from the .env file, once."""
+    global _env_loaded
+    if not _env_loaded:
+        load_dotenv()
+        _env_loaded = True
 
 def get_client():
     """Get or initialize the OpenAI client."""
     global client
     if client is None:
+        _load_env()
+        http_client = httpx.Client(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
         try:
-            client = OpenAI()
+            client = OpenAI(http_client=http_client, max_retries=MAX_RETRIES)
         except OpenAIError as e:
+            http_client.close()
             print(f"Error initializing OpenAI client: {e}")
             print("Please make sure your OPENAI_API_KEY is set correctly in your .env file.")
             raise
     return client
 
-def create_timeline(user_input_text: str) -> dict:
+async def get_async_client() -> AsyncOpenAI:
+    """Get or initialize the asyncio OpenAI client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    async_client = _async_clients.get(loop)
+    if async_client is None:
+        _load_env()
+        http_client = httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+        try:
+            async_client = AsyncOpenAI(http_client=http_client, max_retries=MAX_RETRIES)
+        except OpenAIError as e:
+            await http_client.aclose()
+            print(f"Error initializing OpenAI client: {e}")
+            print("Please make sure your OPENAI_API_KEY is set correctly in your .env file.")
+            raise
+        _async_clients[loop] = async_client
+    return async_client
+
+# --- PROMPT ---
+# Models to try in order: the cheap one first, the stronger one only if its output
+# fails validation. Override with a comma-separated SCHEDULER_MODELS.
+DEFAULT_MODELS = ("gpt-4o-mini", "gpt-4o")
+
+def _parse_models(spec: str) -> tuple:
+    """Split a comma-separated model list, falling back to DEFAULT_MODELS if it names none."""
+    return tuple(model.strip() for model in spec.split(",") if model.strip()) or DEFAULT_MODELS
+
+MODELS = _parse_models(os.environ.get("SCHEDULER_MODELS", ""))
+
+# The current time sent to the model is rounded down to this many minutes, so calls
+# made close together send identical prompts and can share cached prefixes and
+# responses. The schedule may then start up to this much before the true "now",
+# which is harmless next to the 60-90 minute blocks the model plans.
+PROMPT_TIME_GRANULARITY_MINUTES = 15
+
+def _context_message(now: datetime) -> dict:
+    """The small per-call message that follows the static system prompt."""
+    bucket_minute = now.minute - now.minute % PROMPT_TIME_GRANULARITY_MINUTES
+    prompt_time = now.replace(minute=bucket_minute)
+    return {
+        "role": "system",
+        "content": CONTEXT_TEMPLATE.format(date=now.strftime('%Y-%m-%d'), time=prompt_time.strftime('%H:%M'))
+    }
+
+# --- INPUT PREPROCESSING ---
+# Markdown headers need a space after the #s, so "#urgent call mom" stays a task
+_HEADER_RE = re.compile(r'^#{1,6}(?:\s+(.*))?$')
+# A list marker, optionally followed by a checkbox: "- ", "* ", "1. ", "- [ ] ", "- [x] "
+_BULLET_RE = re.compile(r'^(?:[-*+]|\d+[.)])(?:\s+|$)(?:\[([ xX]?)\]\s*)?')
+_WHITESPACE_RE = re.compile(r'\s+')
+# Indentation emitted per nesting level, however deeply the input indents
+_NEST_INDENT = "  "
+
+def compact_tasks(md: str) -> str:
+    """
+    Reduce a markdown task list to the lines that matter for scheduling.
+    Checkboxes, list markers, empty bullets and blank lines are dropped and runs of
+    whitespace collapsed, so fewer input tokens are billed. Each header is kept
+    once, as a "[Category]" line above its tasks, and checked-off items are
+    prefixed with "done:". Nested items keep their nesting, normalized to two
+    spaces per level, so details such as due dates stay tied to their parent task.
+    """
+    lines = []
+    # Headers are held back until a task shows up, so empty sections vanish
+    pending_header = None
+    # Source indentation of each open nesting level, outermost first
+    indents: List[int] = []
+    for line in md.splitlines():
+        stripped = _WHITESPACE_RE.sub(' ', line).strip()
+        if not stripped:
+            continue
+
+        header = _HEADER_RE.match(stripped)
+        if header:
+            pending_header = header.group(1) or None
+            indents = []
+            continue
+
+        bullet = _BULLET_RE.match(stripped)
+        if bullet:
+            text = stripped[bullet.end():]
+            if not text:
+                continue
+            if bullet.group(1) in ('x', 'X'):
+                text = "done: " + text
+        else:
+            text = stripped
+
+        expanded = line.expandtabs(4)
+        indent = len(expanded) - len(expanded.lstrip())
+        while indents and indents[-1] >= indent:
+            indents.pop()
+        depth = len(indents)
+        indents.append(indent)
+
+        if pending_header:
+            lines.append(f"[{pending_header}]")
+            pending_header = None
+        lines.append(_NEST_INDENT * depth + text)
+
+    return "\n".join(lines)
+
+# --- RESPONSE CACHE ---
+# On-disk sidecar so cached schedules survive between runs
+CACHE_PATH = os.environ.get("SCHEDULER_CACHE_PATH", ".scheduler_cache.sqlite")
+
+# In-memory layer in front of the SQLite cache, keyed by _cache_key()
+_CACHE: Dict[str, dict] = {}
+_cache_db = None
+
+def _cache_scope(now: datetime, end_time: Optional[str] = None) -> str:
+    """
+    Everything besides the input text that a cached schedule depends on.
+    The hour bucket lets identical inputs share a schedule for up to an hour.
+    """
+    bucket = now.strftime('%Y-%m-%d-%H')
+    return f"{','.join(MODELS)}|{PROMPT_VERSION}|{bucket}|{end_time or DEFAULT_END_TIME}"
+
+def _cache_key(user_input_text: str, now: datetime, end_time: Optional[str] = None) -> str:
+    """Build a content-addressed key for a request."""
+    raw = f"{_cache_scope(now, end_time)}|{user_input_text}"
+    return hashlib.blake2b(raw.encode()).hexdigest()
+
+def _get_cache_db():
+    """Get or open the SQLite cache connection."""
+    global _cache_db
+    if _cache_db is None:
+        _cache_db = sqlite3.connect(CACHE_PATH)
+        _cache_db.execute(
+            "CREATE TABLE IF NOT EXISTS schedules (key TEXT PRIMARY KEY, schedule BLOB NOT NULL)"
+        )
+        _cache_db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (scope TEXT NOT NULL, vector BLOB NOT NULL, schedule BLOB NOT NULL)"
+        )
+        _cache_db.execute("CREATE INDEX IF NOT EXISTS embeddings_scope ON embeddings (scope)")
+    return _cache_db
+
+def _cache_get(key: str) -> Optional[dict]:
+    """Look up a cached schedule, falling back from memory to disk."""
+    if key in _CACHE:
+        return _CACHE[key]
+    try:
+        row = _get_cache_db().execute(
+            "SELECT schedule FROM schedules WHERE key = ?", (key,)
+        ).fetchone()
+    except sqlite3.Error:
+        # A broken cache file should never stop us from generating a schedule
+        return None
+    if row is None:
+        return None
+    try:
+        schedule = orjson.loads(row[0])
+    except orjson.JSONDecodeError:
+        # A corrupt row is a miss; drop it so the fresh schedule replaces it
+        try:
+            with _get_cache_db() as db:
+                db.execute("DELETE FROM schedules WHERE key = ?", (key,))
+        except sqlite3.Error:
+            pass
+        return None
+    _CACHE[key] = schedule
+    return schedule
+
+def _cache_put(key: str, schedule: dict) -> None:
+    """Store a schedule in memory and write it through to disk."""
+    _CACHE[key] = schedule
+    try:
+        db = _get_cache_db()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO schedules (key, schedule) VALUES (?, ?)",
+                (key, orjson.dumps(schedule))
+            )
+    except sqlite3.Error:
+        pass
+
+def clear_cache() -> None:
+    """Drop every cached schedule, both in memory and on disk."""
+    global _cache_db
+    _CACHE.clear()
+    if _cache_db is not None:
+        _cache_db.close()
+        _cache_db = None
+    if os.path.exists(CACHE_PATH):
+        os.remove(CACHE_PATH)
+
+# --- SEMANTIC CACHE ---
+# Second-level cache for inputs that differ only trivially (a typo, reordered lines).
+# Off by default: every exact-cache miss costs an extra embeddings call.
+SEMANTIC_CACHE = os.environ.get("SCHEDULER_SEMANTIC_CACHE", "") == "1"
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Cosine similarity above which two task lists are treated as the same
+SEMANTIC_THRESHOLD = 0.92
+
+def _unit_vector(embedding: List[float]) -> array:
+    """Normalize an embedding so a dot product is its cosine similarity."""
+    norm = math.sqrt(sum(x * x for x in embedding)) or 1.0
+    return array('f', (x / norm for x in embedding))
+
+def _embed(user_input_text: str) -> Optional[array]:
+    """Embed the compacted input, or return None if the embeddings call fails."""
+    try:
+        response = get_client().embeddings.create(model=EMBEDDING_MODEL, input=user_input_text)
+    except OpenAIError:
+        return None
+    return _unit_vector(response.data[0].embedding)
+
+async def _aembed(user_input_text: str) -> Optional[array]:
+    """Asyncio version of _embed."""
+    try:
+        async_client = await get_async_client()
+        response = await async_client.embeddings.create(model=EMBEDDING_MODEL, input=user_input_text)
+    except OpenAIError:
+        return None
+    return _unit_vector(response.data[0].embedding)
+
+def _semantic_get(scope: str, vector: array) -> Optional[dict]:
+    """
+    Return the stored schedule whose input is most similar to vector, if it clears
+    SEMANTIC_THRESHOLD. Only entries from the same scope (models, prompt version,
+    hour and end time) are considered. The handful of entries per scope makes a
+    linear scan cheaper than maintaining an index.
+    """
+    try:
+        rows = _get_cache_db().execute(
+            "SELECT vector, schedule FROM embeddings WHERE scope = ?", (scope,)
+        ).fetchall()
+    except sqlite3.Error:
+        return None
+
+    best_score, best_schedule = SEMANTIC_THRESHOLD, None
+    for stored_bytes, schedule_bytes in rows:
+        stored = array('f')
+        try:
+            stored.frombytes(stored_bytes)
+        except ValueError:
+            # Truncated vector: skip the entry rather than fail the lookup
+            continue
+        score = sum(map(operator.mul, vector, stored))
+        if score > best_score:
+            best_score, best_schedule = score, schedule_bytes
+    if best_schedule is None:
+        return None
+    try:
+        return orjson.loads(best_schedule)
+    except orjson.JSONDecodeError:
+        return None
+
+def _semantic_put(scope: str, vector: array, schedule: dict) -> None:
+    """Remember a schedule under its input's embedding."""
+    try:
+        db = _get_cache_db()
+        with db:
+            db.execute(
+                "INSERT INTO embeddings (scope, vector, schedule) VALUES (?, ?, ?)",
+                (scope, vector.tobytes(), orjson.dumps(schedule))
+            )
+    except sqlite3.Error:
+        pass
+
+def _request_kwargs(user_input_text: str, now: datetime, model: str,
+                    end_time: Optional[str] = None) -> dict:
+    """Build the chat completion arguments shared by the sync and async paths."""
+    return {
+        "model": model,
+        "response_format": {"type": "json_schema", "json_schema": SCHEDULE_SCHEMA},
+        "messages": [
+            {"role": "system", "content": build_system_prompt(end_time)},
+            _context_message(now),
+            {"role": "user", "content": user_input_text}
+        ]
+    }
+
+def _empty_schedule(now: datetime) -> dict:
+    """The schedule for input that contains no tasks, built without asking the model."""
+    return {"schedule_date": now.strftime('%Y-%m-%d'), "tasks": []}
+
+# --- OUTPUT MODEL ---
+class TaskBlock(BaseModel):
+    """One scheduled block, as described by SCHEDULE_SCHEMA."""
+    task_name: str
+    start_time: str
+    end_time: str
+    duration_minutes: int
+
+class Schedule(BaseModel):
+    """A full day's schedule; anything that doesn't fit raises ValidationError."""
+    schedule_date: str
+    tasks: List[TaskBlock]
+
+def _parse_schedule(content: str) -> dict:
+    """Decode and validate one schedule; raises ValueError if it is unusable."""
+    # The schema is enforced by the API; this is the last line of defence.
+    # pydantic parses the raw JSON directly, so there's no intermediate dict to check.
+    return Schedule.model_validate_json(content).model_dump()
+
+def _collect_stream(stream, on_delta: Callable[[str], None]) -> str:
+    """Pass each streamed content delta to on_delta and return the full text."""
+    parts = []
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            parts.append(delta)
+            on_delta(delta)
+    return "".join(parts)
+
+def create_timeline(user_input_text: str, on_delta: Optional[Callable[[str], None]] = None,
+                    end_time: Optional[str] = None) -> dict:
     """
     Converts unstructured user text into a structured JSON timeline using an LLM.
+
+    Args:
+        user_input_text: The unstructured task list to schedule
+        on_delta: Optional callback; when given, the completion is streamed and each
+            chunk of text is passed to it as soon as it arrives
+        end_time: When the workday ends (HH:MM); defaults to prompts.DEFAULT_END_TIME
     """
     
+    user_input_text = compact_tasks(user_input_text)
+
     # Get the current date and time to pass to the model
     now = datetime.now()
-    current_date = now.strftime('%Y-%m-%d')
-    current_time = now.strftime('%H:%M')
-
-    # This is a refined "zero-shot" prompt. It gives clearer, more dynamic instructions
-    # instead of a static example, which makes it more robust.
-    system_prompt = f"""
-    You are an expert scheduling assistant. Your task is to convert a user's unstructured to-do list into a structured JSON timeline.
-
-    **Current Context:**
-    - Today's Date: {current_date}
-    - Current Time: {current_time}
-
-    **Your Instructions:**
-    1.  **Define Working Hours**: The user's workday ends at **11:00 PM (23:00)**. You should schedule focused work blocks and necessary breaks up until this time.
-    2.  **Analyze and Prioritize**: Scrutinize the user's entire input to identify the highest-priority tasks that must be done *today*. Priority is determined by the closest deadlines (e.g., "due tomorrow" is higher priority than "due next week") and explicit user commands (e.g., "do this today").
-    3.  **Build a Logical Schedule**: Create a realistic schedule for the rest of the day, starting from the **Current Time** ({current_time}) and ending at **23:00**.
-    4.  **Structure Time Blocks**: Allocate focused work blocks (typically 60-90 minutes) for demanding tasks and shorter blocks for minor ones. Intelligently place short breaks (15 mins) between tasks and at least one longer break (e.g., for dinner).
-    5.  **Enrich Task Names**: Make the `task_name` in the JSON descriptive. If a task has a deadline, mention it (e.g., "Work on Presentation (Due Sep 26th)").
-    6.  **Strict JSON Output**: Your final output MUST be a valid JSON object and nothing else. Do not include any explanatory text, markdown, or comments.
-
-    **JSON Output Schema:**
-    {{
-    "schedule_date": "YYYY-MM-DD",
-    "tasks": [
-        {{
-        "task_name": "Descriptive name of the task",
-        "start_time": "HH:MM",
-        "end_time": "HH:MM",
-        "duration_minutes": integer
-        }}
-    ]
-    }}
+
+    # Nothing but whitespace, headers or empty bullets: no need to call the API
+    if not user_input_text:
+        return _empty_schedule(now)
+
+    # Identical input within the same hour reuses the previous schedule
+    key = _cache_key(user_input_text, now, end_time)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    # Near-identical input in the same scope can reuse that schedule too
+    scope = _cache_scope(now, end_time)
+    vector = _embed(user_input_text) if SEMANTIC_CACHE else None
+    if vector is not None:
+        similar = _semantic_get(scope, vector)
+        if similar is not None:
+            _cache_put(key, similar)
+            return similar
+
+    try:
+        for attempt, model in enumerate(MODELS):
+            request = _request_kwargs(user_input_text, now, model, end_time)
+            if on_delta is None:
+                response = get_client().chat.completions.create(**request)
+                content = response.choices[0].message.content
+            else:
+                stream = get_client().chat.completions.create(stream=True, **request)
+                content = _collect_stream(stream, on_delta)
+
+            try:
+                schedule_json = _parse_schedule(content)
+            except ValueError as e:
+                if on_delta is not None:
+                    # The invalid output was already streamed; end it before the notice
+                    print()
+                print(f"Invalid schedule from {model}: {e}")
+                # Escalate to the next (stronger) model
+                if on_delta is not None and attempt + 1 < len(MODELS):
+                    print(f"--- Retrying with {MODELS[attempt + 1]} ---")
+                continue
+            _cache_put(key, schedule_json)
+            if vector is not None:
+                _semantic_put(scope, vector, schedule_json)
+            return schedule_json
+
+        print("An error occurred: no model produced a valid schedule")
+        return None
+
+    except RateLimitError as e:
+        print(f"Rate limited by the OpenAI API, even after {MAX_RETRIES} retries: {e}")
+        return None
+    except OpenAIError as e:
+        print(f"An error occurred: {e}")
+        return None
+
+async def acreate_timeline(user_input_text: str, end_time: Optional[str] = None) -> dict:
     """
-    
+    Asyncio version of create_timeline, so several schedules can be requested at once.
+    """
+    user_input_text = compact_tasks(user_input_text)
+    now = datetime.now()
+
+    if not user_input_text:
+        return _empty_schedule(now)
+
+    key = _cache_key(user_input_text, now, end_time)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    scope = _cache_scope(now, end_time)
+    vector = await _aembed(user_input_text) if SEMANTIC_CACHE else None
+    if vector is not None:
+        similar = _semantic_get(scope, vector)
+        if similar is not None:
+            _cache_put(key, similar)
+            return similar
+
     try:
-        response = get_client().chat.completions.create(
-            model="gpt-4o",  # Using a more powerful model can improve reasoning
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_input_text}
-            ]
-        )
-        
-        schedule_json = json.loads(response.choices[0].message.content)
-        return schedule_json
+        for model in MODELS:
+            async_client = await get_async_client()
+            response = await async_client.chat.completions.create(
+                **_request_kwargs(user_input_text, now, model, end_time)
+            )
 
-    except Exception as e:
+            try:
+                schedule_json = _parse_schedule(response.choices[0].message.content)
+            except ValueError as e:
+                print(f"Invalid schedule from {model}: {e}")
+                continue
+            _cache_put(key, schedule_json)
+            if vector is not None:
+                _semantic_put(scope, vector, schedule_json)
+            return schedule_json
+
+        print("An error occurred: no model produced a valid schedule")
+        return None
+
+    except RateLimitError as e:
+        print(f"Rate limited by the OpenAI API, even after {MAX_RETRIES} retries: {e}")
+        return None
+    except OpenAIError as e:
         print(f"An error occurred: {e}")
         return None
 
+async def create_timelines(user_input_texts: List[str], max_concurrency: int = 10,
+                           end_time: Optional[str] = None) -> List[dict]:
+    """
+    Generate a timeline for each input concurrently.
+    Results come back in input order; failed inputs yield None, as in create_timeline.
+
+    Args:
+        user_input_texts: The unstructured task lists to schedule
+        max_concurrency: Upper bound on requests in flight at the same time
+        end_time: When the workday ends (HH:MM), as in create_timeline
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def one(user_input_text):
+        async with semaphore:
+            return await acreate_timeline(user_input_text, end_time)
+
+    return await asyncio.gather(*(one(text) for text in user_input_texts))
+
+# --- MARSHALED REQUESTS ---
+# Per-call latency grows with input size, so only a handful of lists share a call
+MAX_MARSHALED_INPUTS = 8
+
+def _parse_marshaled(content: str) -> Dict[int, dict]:
+    """Decode a MULTI_SCHEDULE_SCHEMA response into {input id: schedule}."""
+    try:
+        schedules = orjson.loads(content)["schedules"]
+        return {entry.pop("id"): entry for entry in schedules}
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"unexpected response shape: {e}") from e
+
+async def create_timelines_marshaled(user_input_texts: List[str], k: int = 4,
+                                     max_concurrency: int = 10,
+                                     end_time: Optional[str] = None) -> List[dict]:
+    """
+    Generate timelines by packing up to k inputs into each request, so the shared
+    system prompt is paid once per group instead of once per input.
+    Results come back in input order; inputs that failed yield None.
+
+    Args:
+        user_input_texts: The unstructured task lists to schedule
+        k: Inputs per request, capped at MAX_MARSHALED_INPUTS
+        max_concurrency: Upper bound on requests in flight at the same time
+        end_time: When the workday ends (HH:MM), as in create_timeline
+    """
+    k = max(1, min(k, MAX_MARSHALED_INPUTS))
+    user_input_texts = [compact_tasks(text) for text in user_input_texts]
+    now = datetime.now()
+    keys = [_cache_key(text, now, end_time) for text in user_input_texts]
+    results = [_cache_get(key) if text else _empty_schedule(now)
+               for key, text in zip(keys, user_input_texts)]
+    pending = [i for i, cached in enumerate(results) if cached is None]
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def one(group):
+        for model in MODELS:
+            user_content = "\n".join(
+                f"### INPUT {n}\n{user_input_texts[i]}" for n, i in enumerate(group, start=1)
+            )
+            request = _request_kwargs(user_content, now, model, end_time)
+            request["response_format"] = {"type": "json_schema", "json_schema": MULTI_SCHEDULE_SCHEMA}
+            request["messages"].insert(1, {"role": "system", "content": MARSHALED_PROMPT})
+
+            try:
+                async with semaphore:
+                    async_client = await get_async_client()
+                    response = await async_client.chat.completions.create(**request)
+            except OpenAIError as e:
+                print(f"An error occurred: {e}")
+                return
+
+            try:
+                by_id = _parse_marshaled(response.choices[0].message.content)
+            except ValueError as e:
+                print(f"Invalid schedules from {model}: {e}")
+                continue
+
+            # Keep the valid schedules; only the inputs that failed go to the next model
+            missing = []
+            for n, i in enumerate(group, start=1):
+                try:
+                    schedule_json = Schedule.model_validate(by_id.get(n)).model_dump()
+                except ValueError:
+                    missing.append(i)
+                    continue
+                _cache_put(keys[i], schedule_json)
+                results[i] = schedule_json
+            if not missing:
+                return
+            group = missing
+
+    await asyncio.gather(*(one(pending[j:j + k]) for j in range(0, len(pending), k)))
+    return results
+
+# --- BATCH API ---
+# How often to check on a submitted batch. Batches may take up to 24h, at half the price.
+BATCH_POLL_SECONDS = 30
+_BATCH_DONE_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+def create_timelines_batch(user_input_texts: List[str], poll_interval: float = BATCH_POLL_SECONDS,
+                           end_time: Optional[str] = None) -> List[dict]:
+    """
+    Generate timelines through the OpenAI Batch API, for bulk runs that can wait.
+    Blocks until the batch finishes. Results come back in input order; inputs that
+    failed yield None, as in create_timeline.
+    """
+    user_input_texts = [compact_tasks(text) for text in user_input_texts]
+    now = datetime.now()
+    keys = [_cache_key(text, now, end_time) for text in user_input_texts]
+    results = [_cache_get(key) if text else _empty_schedule(now)
+               for key, text in zip(keys, user_input_texts)]
+    pending = [i for i, cached in enumerate(results) if cached is None]
+    if not pending:
+        return results
+
+    # One JSONL request line per input; custom_id maps the answer back to its input
+    request_lines = [
+        orjson.dumps({
+            "custom_id": str(i),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            # Batches are for bulk runs, so there is no fallback to a stronger model
+            "body": _request_kwargs(user_input_texts[i], now, MODELS[0], end_time)
+        })
+        for i in pending
+    ]
+
+    try:
+        batch_client = get_client()
+        input_file = batch_client.files.create(
+            file=("schedules.jsonl", b"\n".join(request_lines)),
+            purpose="batch"
+        )
+        batch = batch_client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        print(f"Submitted batch {batch.id} with {len(pending)} request(s).")
+
+        while batch.status not in _BATCH_DONE_STATUSES:
+            time.sleep(poll_interval)
+            batch = batch_client.batches.retrieve(batch.id)
+
+        if batch.status != "completed" or not batch.output_file_id:
+            print(f"An error occurred: batch {batch.id} ended with status '{batch.status}'")
+            return results
+
+        output = batch_client.files.content(batch.output_file_id).text
+    except OpenAIError as e:
+        print(f"An error occurred: {e}")
+        return results
+
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = orjson.loads(line)
+            i = int(record["custom_id"])
+            body = record["response"]["body"]
+            schedule_json = _parse_schedule(body["choices"][0]["message"]["content"])
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            # A failed request inside the batch has no response body
+            print(f"An error occurred: {e}")
+            continue
+        _cache_put(keys[i], schedule_json)
+        results[i] = schedule_json
+
+    return results
+
+def schedule_filename(input_filename: str, input_count: int) -> str:
+    """
+    Where to save the schedule generated from input_filename. A single input writes
+    schedule.json; with several, each schedule goes next to its own input
+    (x/work.md -> x/work.schedule.json), so same-named inputs never collide.
+    """
+    if input_count == 1:
+        return "schedule.json"
+    return os.path.splitext(input_filename)[0] + ".schedule.json"
+
+def _end_time_arg(value: str) -> str:
+    """argparse type for --end-time: a 24h HH:MM time."""
+    try:
+        return datetime.strptime(value, '%H:%M').strftime('%H:%M')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a 24h HH:MM time, got '{value}'")
+
 # --- HOW TO USE IT ---
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Generate a JSON schedule from a markdown file of tasks.")
-    parser.add_argument("filename", help="The path to the markdown file containing the tasks.")
+    parser = argparse.ArgumentParser(description="Generate a JSON schedule from markdown files of tasks.")
+    parser.add_argument("filenames", nargs="+", metavar="filename",
+                        help="The path to a markdown file containing the tasks. Several files are scheduled concurrently.")
+    parser.add_argument("--end-time", type=_end_time_arg, metavar="HH:MM",
+                        help="When your workday ends (default: 23:00).")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--batch", action="store_true",
+                      help="Submit through the OpenAI Batch API: half the cost, but results can take up to 24h.")
+    mode.add_argument("--stream", action="store_true",
+                      help="Print the schedule as the model writes it (single file only).")
     args = parser.parse_args()
+    if args.stream and len(args.filenames) > 1:
+        parser.error("--stream only works with a single file")
+
+    tasks_from_files = []
+    for filename in args.filenames:
+        try:
+            with open(filename, 'r') as f:
+                tasks_from_files.append(f.read())
+        except FileNotFoundError:
+            print(f"Error: The file '{filename}' was not found.")
+            sys.exit(1)
+        except Exception as e:
+            print(f"An error occurred while reading the file: {e}")
+            sys.exit(1)
+
+    print(f"Generating timeline from {', '.join(repr(name) for name in args.filenames)}...")
+    if args.batch:
+        timelines = create_timelines_batch(tasks_from_files, end_time=args.end_time)
+    elif args.stream:
+        timelines = [create_timeline(tasks_from_files[0], on_delta=lambda d: print(d, end="", flush=True),
+                                     end_time=args.end_time)]
+        print()
+    else:
+        timelines = asyncio.run(create_timelines(tasks_from_files, end_time=args.end_time))
+
+    for filename, timeline in zip(args.filenames, timelines):
+        if not timeline:
+            continue
+
+        # Serialize once and reuse the bytes for both the console and the file
+        pretty = orjson.dumps(timeline, option=orjson.OPT_INDENT_2)
 
-    try:
-        with open(args.filename, 'r') as f:
-            tasks_from_file = f.read()
-    except FileNotFoundError:
-        print(f"Error: The file '{args.filename}' was not found.")
-        exit()
-    except Exception as e:
-        print(f"An error occurred while reading the file: {e}")
-        exit()
-
-    print(f"Generating timeline from '{args.filename}'...")
-    timeline = create_timeline(tasks_from_file)
-    
-    if timeline:
         # Pretty-print the JSON to the console
-        print("--- Generated Schedule ---")
-        print(json.dumps(timeline, indent=2))
-        
-        # Save the output to a file
-        output_filename = "schedule.json"
-        with open(output_filename, 'w') as f:
-            json.dump(timeline, f, indent=2)
+        print(f"--- Generated Schedule ({filename}) ---", flush=True)
+        sys.stdout.buffer.write(pretty + b"\n")
+        sys.stdout.buffer.flush()
+
+        # Save the output to a file; one input keeps the familiar schedule.json name
+        output_filename = schedule_filename(filename, len(args.filenames))
+        with open(output_filename, 'wb') as f:
+            f.write(pretty)
         print(f"\n✅ Schedule successfully saved to '{output_filename}'")
@@ -7,18 +7,33 @@ This program is free software under the GPL-3.0 license.
 """
 
 import pytest
+import asyncio
 import json
 import os
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 import sys
+import tempfile
+import weakref
 
 # Add parent directory to path to import scheduler
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from scheduler import create_timeline
+import scheduler
+from scheduler import create_timeline, clear_cache
+from prompts import STATIC_SYSTEM_PROMPT, build_system_prompt
 
 
 class TestScheduler:
     """Test cases for the scheduler module."""
+
+    def setup_method(self):
+        """Point the response cache at a throwaway file and start empty."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        scheduler.CACHE_PATH = os.path.join(self.tmpdir.name, "cache.sqlite")
+        clear_cache()
+
+    def teardown_method(self):
+        clear_cache()
+        self.tmpdir.cleanup()
     
     def test_create_timeline_returns_dict(self):
         """Test that create_timeline returns a dictionary."""
@@ -53,6 +68,13 @@ class TestScheduler:
             
             result = create_timeline("")
             assert isinstance(result, dict)
+            assert result["tasks"] == []
+            mock_client.chat.completions.create.assert_not_called()
+
+            # Headers and empty bullets alone don't warrant an API call either
+            result = create_timeline("## Today\n\n- [ ]\n-\n")
+            assert result["tasks"] == []
+            mock_client.chat.completions.create.assert_not_called()
     
     def test_create_timeline_includes_required_fields(self):
         """Test that the returned schedule includes required fields."""
@@ -84,3 +106,463 @@ class TestScheduler:
                 assert "end_time" in task
                 assert "duration_minutes" in task
 
+    def test_create_timeline_caches_identical_input(self):
+        """Test that a repeated input is served from the cache."""
+        with patch('scheduler.get_client') as mock_get_client:
+            mock_client = MagicMock()
+            mock_get_client.return_value = mock_client
+            mock_response = MagicMock()
+            mock_response.choices = [MagicMock()]
+            mock_response.choices[0].message.content = json.dumps({
+                "schedule_date": "2024-01-01",
+                "tasks": []
+            })
+            mock_client.chat.completions.create.return_value = mock_response
+
+            first = create_timeline("Cached task list")
+            second = create_timeline("Cached task list")
+            assert first == second
+            assert mock_client.chat.completions.create.call_count == 1
+
+    def test_cache_persists_to_disk_until_cleared(self):
+        """Test that cached schedules survive a memory reset but not clear_cache()."""
+        with patch('scheduler.get_client') as mock_get_client:
+            mock_client = MagicMock()
+            mock_get_client.return_value = mock_client
+            mock_response = MagicMock()
+            mock_response.choices = [MagicMock()]
+            mock_response.choices[0].message.content = json.dumps({
+                "schedule_date": "2024-01-01",
+                "tasks": []
+            })
+            mock_client.chat.completions.create.return_value = mock_response
+
+            create_timeline("Persisted task list")
+            scheduler._CACHE.clear()
+            create_timeline("Persisted task list")
+            assert mock_client.chat.completions.create.call_count == 1
+
+            clear_cache()
+            create_timeline("Persisted task list")
+            assert mock_client.chat.completions.create.call_count == 2
+
+    def test_system_prompt_prefix_is_static(self):
+        """Test that the date and time are sent after the static system prompt."""
+        with patch('scheduler.get_client') as mock_get_client:
+            mock_client = MagicMock()
+            mock_get_client.return_value = mock_client
+            mock_response = MagicMock()
+            mock_response.choices = [MagicMock()]
+            mock_response.choices[0].message.content = json.dumps({
+                "schedule_date": "2024-01-01",
+                "tasks": []
+            })
+            mock_client.chat.completions.create.return_value = mock_response
+
+            create_timeline("Test task list")
+            messages = mock_client.chat.completions.create.call_args.kwargs["messages"]
+            assert messages[0]["content"].startswith(STATIC_SYSTEM_PROMPT)
+            assert "Current Context" in messages[1]["content"]
+            assert messages[-1]["content"] == "Test task list"
+
+    def test_create_timeline_requests_structured_output(self):
+        """Test that the schedule schema is enforced via response_format."""
+        with patch('scheduler.get_client') as mock_get_client:
+            mock_client = MagicMock()
+            mock_get_client.return_value = mock_client
+            mock_response = MagicMock()
+            mock_response.choices = [MagicMock()]
+            mock_response.choices[0].message.content = json.dumps({
+                "schedule_date": "2024-01-01",
+                "tasks": []
+            })
+            mock_client.chat.completions.create.return_value = mock_response
+
+            create_timeline("Test task list")
+            response_format = mock_client.chat.completions.create.call_args.kwargs["response_format"]
+            assert response_format["type"] == "json_schema"
+            assert response_format["json_schema"] == scheduler.SCHEDULE_SCHEMA
+
+    def test_create_timelines_runs_inputs_concurrently(self):
+        """Test that create_timelines returns one schedule per input, in order."""
+        from scheduler import create_timelines
+
+        async def fake_create(**kwargs):
+            user_text = kwargs["messages"][-1]["content"]
+            mock_response = MagicMock()
+            mock_response.choices = [MagicMock()]
+            mock_response.choices[0].message.content = json.dumps({
+                "schedule_date": "2024-01-01",
+                "tasks": [{
+                    "task_name": user_text,
+                    "start_time": "10:00",
+                    "end_time": "11:00",
+                    "duration_minutes": 60
+                }]
+            })
+            return mock_response
+
+        with patch('scheduler.get_async_client') as mock_get_client:
+            mock_client = MagicMock()
+            mock_get_client.return_value = mock_client
+            mock_client.chat.completions.create.side_effect = fake_create
+
+            results = asyncio.run(create_timelines(["List A", "List B"], max_concurrency=1))
+            assert [r["tasks"][0]["task_name"] for r in results] == ["List A", "List B"]
+            assert mock_client.chat.completions.create.call_count == 2
+
+    def test_create_timelines_batch_maps_results_by_custom_id(self):
+        """Test that Batch API output lines are matched back to their inputs."""
+        from scheduler import create_timelines_batch
+
+        def output_line(custom_id, task_name):
+            content = json.dumps({
+                "schedule_date": "2024-01-01",
+                "tasks": [{
+                    "task_name": task_name,
+                    "start_time": "10:00",
+                    "end_time": "11:00",
+                    "duration_minutes": 60
+                }]
+            })
+            return json.dumps({
+                "custom_id": custom_id,
+                "response": {"status_code": 200, "body": {"choices": [{"message": {"content": content}}]}}
+            })
+
+        with patch('scheduler.get_client') as mock_get_client:
+            mock_client = MagicMock()
+            mock_get_client.return_value = mock_client
+            mock_client.batches.create.return_value = MagicMock(id="batch_1", status="validating")
+            mock_client.batches.retrieve.return_value = MagicMock(
+                id="batch_1", status="completed", output_file_id="file_out"
+            )
+            # Out of order on purpose: the Batch API does not preserve input order
+            mock_client.files.content.return_value.text = "\n".join([
+                output_line("1", "Second"), output_line("0", "First")
+            ])
+
+            results = create_timelines_batch(["List A", "List B"], poll_interval=0)
+            assert [r["tasks"][0]["task_name"] for r in results] == ["First", "Second"]
+            assert mock_client.files.create.call_args.kwargs["purpose"] == "batch"
+            mock_client.chat.completions.create.assert_not_called()
+
+    def test_create_timelines_marshaled_groups_inputs(self):
+        """Test that inputs are packed k per request and unpacked by id."""
+        from scheduler import create_timelines_marshaled
+
+        async def fake_create(**kwargs):
+            user_text = kwargs["messages"][-1]["content"]
+            count = user_text.count("### INPUT")
+            mock_response = MagicMock()
+            mock_response.choices = [MagicMock()]
+            # Answer in reverse order to check the results are matched by id
+            mock_response.choices[0].message.content = json.dumps({
+                "schedules": [
+                    {"id": n, "schedule_date": "2024-01-01", "tasks": [{
+                        "task_name": user_text.split(f"### INPUT {n}\n")[1].split("\n")[0],
+                        "start_time": "10:00",
+                        "end_time": "11:00",
+                        "duration_minutes": 60
+                    }]}
+                    for n in range(count, 0, -1)
+                ]
+            })
+            return mock_response
+
+        with patch('scheduler.get_async_client') as mock_get_client:
+            mock_client = MagicMock()
+            mock_get_client.return_value = mock_client
+            mock_client.chat.completions.create.side_effect = fake_create
+
+            results = asyncio.run(create_timelines_marshaled(["List A", "List B", "List C"], k=2))
+            assert [r["tasks"][0]["task_name"] for r in results] == ["List A", "List B", "List C"]
+            assert mock_client.chat.completions.create.call_count == 2
+            assert "id" not in results[0]
+
+    def test_create_timeline_streams_to_callback(self):
+        """Test that on_delta receives each streamed chunk and the result is parsed."""
+        content = json.dumps({"schedule_date": "2024-01-01", "tasks": []})
+        chunks = []
+        for piece in (content[:10], content[10:], None):
+            chunk = MagicMock()
+            chunk.choices = [MagicMock()]
+            chunk.choices[0].delta.content = piece
+            chunks.append(chunk)
+
+        with patch('scheduler.get_client') as mock_get_client:
+            mock_client = MagicMock()
+            mock_get_client.return_value = mock_client
+            mock_client.chat.completions.create.return_value = iter(chunks)
+
+            received = []
+            result = create_timeline("Streamed task list", on_delta=received.append)
+            assert result == {"schedule_date": "2024-01-01", "tasks": []}
+            assert "".join(received) == content
+            assert mock_client.chat.completions.create.call_args.kwargs["stream"] is True
+
+    def test_streamed_fallback_is_separated_from_invalid_output(self, capsys):
+        """Test that a streamed retry starts on its own line after a retry notice."""
+        def stream_of(content):
+            chunk = MagicMock()
+            chunk.choices = [MagicMock()]
+            chunk.choices[0].delta.content = content
+            return iter([chunk])
+
+        valid = json.dumps({"schedule_date": "2024-01-01", "tasks": []})
+        with patch('scheduler.get_client') as mock_get_client, \
+             patch.object(scheduler, 'MODELS', ("cheap-model", "strong-model")):
+            mock_client = MagicMock()
+            mock_get_client.return_value = mock_client
+            mock_client.chat.completions.create.side_effect = [
+                stream_of(json.dumps({"tasks": []})), stream_of(valid)
+            ]
+
+            def on_delta(delta):
+                print(delta, end="")
+
+            assert create_timeline("Streamed task list", on_delta=on_delta) is not None
+
+        out = capsys.readouterr().out
+        assert out.startswith('{"tasks": []}\nInvalid schedule from cheap-model')
+        assert out.endswith("--- Retrying with strong-model ---\n" + valid)
+
+    def test_get_client_loads_env_lazily(self):
+        """Test that .env is only read when the first client is created."""
+        with patch('scheduler.load_dotenv') as mock_load_dotenv, \
+             patch('scheduler.OpenAI') as mock_openai, \
+             patch.object(scheduler, 'client', None), \
+             patch.object(scheduler, '_env_loaded', False):
+            mock_load_dotenv.assert_not_called()
+            scheduler.get_client()
+            scheduler.get_client()
+            mock_load_dotenv.assert_called_once()
+            mock_openai.assert_called_once()
+
+    def test_compact_tasks_strips_markdown_noise(self):
+        """Test that compact_tasks keeps tasks and headers but drops markup."""
+        from scheduler import compact_tasks
+        md = (
+            "### Health\n"
+            "\n"
+            "- [ ] Get flu shot   \n"
+            "- [ ]\n"
+            "- [x] Buy   vitamins\n"
+            "\n"
+            "## Empty Section\n"
+            "-\n"
+            "#### Career\n"
+            "* Follow up with founder (due Friday)\n"
+        )
+        assert compact_tasks(md) == (
+            "[Health]\n"
+            "Get flu shot\n"
+            "done: Buy vitamins\n"
+            "[Career]\n"
+            "Follow up with founder (due Friday)"
+        )
+
+    def test_compact_tasks_keeps_hashtag_tasks(self):
+        """Test that a line starting with # but no space is a task, not a header."""
+        from scheduler import compact_tasks
+        md = (
+            "## Personal\n"
+            "#urgent call mom\n"
+            "## Work\n"
+            "- Send report\n"
+        )
+        assert compact_tasks(md) == (
+            "[Personal]\n"
+            "#urgent call mom\n"
+            "[Work]\n"
+            "Send report"
+        )
+
+    def test_compact_tasks_keeps_nesting(self):
+        """Test that nested bullets stay under their parent task."""
+        from scheduler import compact_tasks
+        md = (
+            "- [ ] HW5\n"
+            "    - part a due Oct 5\n"
+            "\t\t- [x] read chapter\n"
+            "    - part b\n"
+            "- [ ] Laundry\n"
+        )
+        assert compact_tasks(md) == (
+            "HW5\n"
+            "  part a due Oct 5\n"
+            "    done: read chapter\n"
+            "  part b\n"
+            "Laundry"
+        )
+
+    def test_create_timeline_falls_back_to_stronger_model(self):
+        """Test that an invalid schedule from the first model triggers a retry with the next."""
+        invalid_response = MagicMock()
+        invalid_response.choices = [MagicMock()]
+        invalid_response.choices[0].message.content = json.dumps({"tasks": []})
+        valid_response = MagicMock()
+        valid_response.choices = [MagicMock()]
+        valid_response.choices[0].message.content = json.dumps({
+            "schedule_date": "2024-01-01",
+            "tasks": []
+        })
+
+        with patch('scheduler.get_client') as mock_get_client, \
+             patch.object(scheduler, 'MODELS', ("cheap-model", "strong-model")):
+            mock_client = MagicMock()
+            mock_get_client.return_value = mock_client
+            mock_client.chat.completions.create.side_effect = [invalid_response, valid_response]
+
+            result = create_timeline("Test task list")
+            assert result == {"schedule_date": "2024-01-01", "tasks": []}
+            models = [c.kwargs["model"] for c in mock_client.chat.completions.create.call_args_list]
+            assert models == ["cheap-model", "strong-model"]
+
+    def test_corrupt_cache_row_is_a_miss(self):
+        """Test that an undecodable cached schedule is dropped and treated as a miss."""
+        db = scheduler._get_cache_db()
+        with db:
+            db.execute("INSERT INTO schedules (key, schedule) VALUES (?, ?)", ("bad", b"{not json"))
+
+        assert scheduler._cache_get("bad") is None
+        assert db.execute("SELECT COUNT(*) FROM schedules WHERE key = 'bad'").fetchone()[0] == 0
+
+    def test_schedule_filename_keeps_same_named_inputs_apart(self):
+        """Test that same-named inputs in different directories get different outputs."""
+        from scheduler import schedule_filename
+        outputs = [schedule_filename(name, 2) for name in ("x/tasks.md", "y/tasks.md")]
+        assert outputs == ["x/tasks.schedule.json", "y/tasks.schedule.json"]
+        assert schedule_filename("x/tasks.md", 1) == "schedule.json"
+
+    def test_empty_model_list_falls_back_to_default_cascade(self):
+        """Test that a SCHEDULER_MODELS naming no models still yields the default cascade."""
+        assert scheduler._parse_models("") == scheduler.DEFAULT_MODELS
+        assert scheduler._parse_models(" , ,") == scheduler.DEFAULT_MODELS
+        assert scheduler._parse_models("a, b,") == ("a", "b")
+
+    def test_get_client_uses_pooled_http_client(self):
+        """Test that the OpenAI client is built on a shared keep-alive httpx client."""
+        import httpx
+        with patch('scheduler.OpenAI') as mock_openai, \
+             patch.object(scheduler, 'client', None):
+            scheduler.get_client()
+            http_client = mock_openai.call_args.kwargs["http_client"]
+            assert isinstance(http_client, httpx.Client)
+            http_client.close()
+
+    def test_get_async_client_is_per_event_loop(self):
+        """Test that each event loop gets its own async client, reused within that loop."""
+        async def get_twice():
+            return await scheduler.get_async_client(), await scheduler.get_async_client()
+
+        with patch('scheduler.AsyncOpenAI', side_effect=lambda **kwargs: MagicMock()), \
+             patch('scheduler.httpx.AsyncClient'), \
+             patch.object(scheduler, '_async_clients', weakref.WeakKeyDictionary()):
+            first, again = asyncio.run(get_twice())
+            second, _ = asyncio.run(get_twice())
+        assert first is again
+        assert first is not second
+
+    def test_get_async_client_closes_http_client_on_error(self):
+        """Test that a failed async client setup closes its httpx client."""
+        from openai import OpenAIError
+        with patch('scheduler.AsyncOpenAI', side_effect=OpenAIError("no key")), \
+             patch('scheduler.httpx.AsyncClient') as mock_http_client, \
+             patch.object(scheduler, '_async_clients', weakref.WeakKeyDictionary()):
+            mock_http_client.return_value.aclose = AsyncMock()
+            with pytest.raises(OpenAIError):
+                asyncio.run(scheduler.get_async_client())
+            mock_http_client.return_value.aclose.assert_awaited_once()
+
+    def test_create_timeline_gives_up_on_rate_limit(self):
+        """Test that a rate limit surviving the SDK's retries returns None without escalating models."""
+        import httpx
+        from openai import RateLimitError
+        rate_limit = RateLimitError(
+            "Rate limit reached",
+            response=httpx.Response(429, request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions")),
+            body=None
+        )
+
+        with patch('scheduler.get_client') as mock_get_client:
+            mock_client = MagicMock()
+            mock_get_client.return_value = mock_client
+            mock_client.chat.completions.create.side_effect = rate_limit
+
+            assert create_timeline("Test task list") is None
+            assert mock_client.chat.completions.create.call_count == 1
+
+    def test_create_timeline_returns_validated_schedule(self):
+        """Test that the result is normalized to the Schedule model."""
+        with patch('scheduler.get_client') as mock_get_client:
+            mock_client = MagicMock()
+            mock_get_client.return_value = mock_client
+            mock_response = MagicMock()
+            mock_response.choices = [MagicMock()]
+            mock_response.choices[0].message.content = json.dumps({
+                "schedule_date": "2024-01-01",
+                "notes": "dropped",
+                "tasks": [{
+                    "task_name": "Test Task",
+                    "start_time": "10:00",
+                    "end_time": "11:00",
+                    "duration_minutes": 60
+                }]
+            })
+            mock_client.chat.completions.create.return_value = mock_response
+
+            result = create_timeline("Test task list")
+            assert "notes" not in result
+            assert result["tasks"][0]["duration_minutes"] == 60
+
+    def test_end_time_only_changes_the_prompt_suffix(self):
+        """Test that every workday end time shares the same static prompt prefix."""
+        default_prompt = build_system_prompt()
+        late_prompt = build_system_prompt("23:30")
+        assert default_prompt.startswith(STATIC_SYSTEM_PROMPT)
+        assert late_prompt.startswith(STATIC_SYSTEM_PROMPT)
+        assert "23:00" in default_prompt
+        assert "23:30" in late_prompt
+
+    def test_semantic_cache_reuses_schedule_for_similar_input(self):
+        """Test that a near-identical input is served from the embedding cache."""
+        embeddings = {
+            "Finish homework 5": [1.0, 0.0, 0.0],
+            "Finish homwork 5": [0.99, 0.05, 0.0],
+            "Plan a birthday party": [0.0, 1.0, 0.0],
+        }
+
+        def fake_embed(model, input):
+            response = MagicMock()
+            response.data = [MagicMock(embedding=embeddings[input])]
+            return response
+
+        with patch('scheduler.get_client') as mock_get_client, \
+             patch.object(scheduler, 'SEMANTIC_CACHE', True):
+            mock_client = MagicMock()
+            mock_get_client.return_value = mock_client
+            mock_client.embeddings.create.side_effect = fake_embed
+            mock_response = MagicMock()
+            mock_response.choices = [MagicMock()]
+            mock_response.choices[0].message.content = json.dumps({
+                "schedule_date": "2024-01-01",
+                "tasks": []
+            })
+            mock_client.chat.completions.create.return_value = mock_response
+
+            first = create_timeline("Finish homework 5")
+            assert create_timeline("Finish homwork 5") == first
+            assert mock_client.chat.completions.create.call_count == 1
+
+            create_timeline("Plan a birthday party")
+            assert mock_client.chat.completions.create.call_count == 2
+
+    def test_context_message_rounds_time_to_bucket(self):
+        """Test that calls within the same 15 minutes send the same context."""
+        from datetime import datetime
+        early = scheduler._context_message(datetime(2024, 1, 1, 10, 31, 5))
+        late = scheduler._context_message(datetime(2024, 1, 1, 10, 44, 59))
+        assert early == late
+        assert "10:30" in early["content"]
+        assert "2024-01-01" in early["content"]
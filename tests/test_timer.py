@@ -7,10 +7,15 @@ This program is free software under the GPL-3.0 license.
 """
 
 import pytest
+import asyncio
+import io
 import json
 import os
+import pty
 import sys
-from unittest.mock import patch, MagicMock, call
+import signal
+import subprocess
+from unittest.mock import patch, MagicMock, AsyncMock, call
 import tempfile
 
 # Mock notify2 BEFORE importing timer to prevent sys.exit() on import failure
@@ -32,27 +37,77 @@ class TestTimerFunctions:
     
     @patch('timer.subprocess.Popen')
     def test_play_alarm_calls_paplay(self, mock_popen):
-        """Test that play_alarm calls paplay."""
+        """Test that play_alarm falls back to paplay without libcanberra or sox."""
         from timer import play_alarm
-        play_alarm()
+        with patch('timer._canberra', False), patch('timer._paplay_stream', False):
+            play_alarm()
         mock_popen.assert_called_once()
         call_args = mock_popen.call_args[0][0]
         assert call_args[0] == "paplay"
     
+    @patch('timer.subprocess.Popen')
+    def test_play_alarm_reuses_paplay_stream(self, mock_popen):
+        """Test that alarms are written to one long-lived paplay process."""
+        from timer import play_alarm
+        with patch('timer._canberra', False), \
+             patch('timer._paplay_stream', None), \
+             patch('timer.subprocess.check_output', return_value=b"pcm") as mock_sox:
+            play_alarm()
+            play_alarm()
+        mock_sox.assert_called_once()
+        mock_popen.assert_called_once()
+        assert "--raw" in mock_popen.call_args[0][0]
+        assert mock_popen.return_value.stdin.write.call_args_list == [call(b"pcm"), call(b"pcm")]
+    
+    @patch('timer.subprocess.Popen')
+    def test_play_alarm_uses_canberra_context(self, mock_popen):
+        """Test that play_alarm plays through one cached libcanberra context."""
+        from timer import play_alarm
+        mock_lib = MagicMock()
+        mock_lib.ca_context_create.return_value = 0
+        mock_lib.ca_context_play.return_value = 0
+        with patch('timer._canberra', None), \
+             patch('timer.ctypes.util.find_library', return_value="libcanberra.so.0"), \
+             patch('timer.ctypes.CDLL', return_value=mock_lib) as mock_cdll:
+            play_alarm()
+            play_alarm()
+        mock_cdll.assert_called_once()
+        mock_lib.ca_context_create.assert_called_once()
+        mock_lib.ca_context_cache.assert_called_once()
+        assert mock_lib.ca_context_play.call_count == 2
+        mock_popen.assert_not_called()
+    
+    @patch('timer.subprocess.run')
+    def test_close_all_notifications_uses_dbus(self, mock_run):
+        """Test that close_all_notifications asks dunst over D-Bus first."""
+        from timer import close_all_notifications
+        mock_iface = MagicMock()
+        with patch.object(mock_notify2, 'dbus_iface', mock_iface, create=True):
+            assert close_all_notifications() is True
+        mock_iface.get_dbus_method.assert_called_once_with(
+            "NotificationCloseAll", "org.dunstproject.cmd0"
+        )
+        mock_iface.get_dbus_method.return_value.assert_called_once_with()
+        mock_run.assert_not_called()
+    
     @patch('timer.subprocess.run')
     def test_close_all_notifications_calls_dunstctl(self, mock_run):
-        """Test that close_all_notifications calls dunstctl close-all."""
+        """Test that close_all_notifications falls back to dunstctl close-all."""
         from timer import close_all_notifications
         mock_run.return_value.returncode = 0
-        result = close_all_notifications()
+        mock_iface = MagicMock()
+        mock_iface.get_dbus_method.side_effect = Exception("not dunst")
+        with patch.object(mock_notify2, 'dbus_iface', mock_iface, create=True):
+            result = close_all_notifications()
         mock_run.assert_called_once()
         call_args = mock_run.call_args[0][0]
         assert call_args[0] == "dunstctl"
         assert call_args[1] == "close-all"
+        assert mock_run.call_args[1]["stdout"] == subprocess.DEVNULL
     
     def test_queue_timeline_notifications_creates_notifications(self):
         """Test that queue_timeline_notifications creates notifications."""
-        from timer import queue_timeline_notifications
+        from timer import queue_timeline_notifications, parse_tasks
         
         # Reset the mock to track new calls
         mock_notify2.Notification.reset_mock()
@@ -72,16 +127,18 @@ class TestTimerFunctions:
             }
         ]
         
-        result = queue_timeline_notifications(tasks, current_index=0)
+        with patch('timer.time.sleep') as mock_sleep:
+            result = queue_timeline_notifications(parse_tasks(tasks), current_index=0)
         
-        # Should create notifications for all tasks
+        # Should create notifications for all tasks, back to back
         assert len(result) == 2
         assert mock_notify2.Notification.call_count == 2
         assert mock_notif.show.call_count == 2
+        mock_sleep.assert_not_called()
     
     def test_update_timeline_notification_updates_correctly(self):
         """Test that update_timeline_notification updates notifications."""
-        from timer import update_timeline_notification
+        from timer import update_timeline_notification, parse_tasks
         
         # Reset the mock to track new calls
         mock_notify2.Notification.reset_mock()
@@ -96,11 +153,183 @@ class TestTimerFunctions:
             }
         ]
         
-        update_timeline_notification(tasks, 0)
+        timeline = [MagicMock()]
+        update_timeline_notification(timeline, parse_tasks(tasks), 0)
         
-        mock_notif.show.assert_called_once()
+        # The queued notification is updated in place rather than rebuilt
+        mock_notify2.Notification.assert_not_called()
+        timeline[0].show.assert_called_once()
         # Check that it was called with completed status
-        assert mock_notify2.Notification.called
-        call_args = mock_notify2.Notification.call_args[0]
+        call_args = timeline[0].update.call_args[0]
         assert "Completed" in call_args[0] or "✅" in call_args[0]
+        timeline[0].set_urgency.assert_called_once_with(mock_notify2.URGENCY_LOW)
+
+
+    def test_run_task_timer_updates_once_per_second(self):
+        """Test that the countdown wakes once per displayed second and ends on time."""
+        from timer import run_task_timer
 
+        mock_notify2.Notification.reset_mock()
+        mock_notif = MagicMock()
+        mock_notify2.Notification.return_value = mock_notif
+
+        # Fake monotonic clock that each wait advances by its timeout
+        clock = [0.0]
+
+        async def fake_wait(event, timeout):
+            clock[0] += timeout
+            return False
+
+        with patch('timer.time.monotonic', side_effect=lambda: clock[0]), \
+             patch('timer._wait_for_event', side_effect=fake_wait), \
+             patch('timer._wait_for_enter', new_callable=AsyncMock), \
+             patch('timer.play_alarm'), \
+             patch('timer._active_notif', None):
+            on_finish = MagicMock()
+            asyncio.run(run_task_timer("Task 1", 1, "End of schedule!", on_finish=on_finish))
+            on_finish.assert_called_once_with()
+
+            # Start notice plus one update per second from 00:59 down to 00:01
+            assert mock_notif.update.call_count == 60
+            assert mock_notif.update.call_args[0] == (
+                "Current Task: Task 1", "<b>00:01 remaining</b>\nNext: End of schedule!"
+            )
+            assert clock[0] == pytest.approx(60.0)
+
+            # The timer notification is reused by the next task; only the alarm is new
+            asyncio.run(run_task_timer("Task 2", 1, "End of schedule!"))
+            assert mock_notify2.Notification.call_count == 3
+    
+    def test_parse_tasks_fills_in_defaults(self):
+        """Test that parse_tasks builds Task records with defaults filled in."""
+        from timer import parse_tasks, Task
+        
+        tasks = parse_tasks([
+            {"task_name": "Task 1", "start_time": "10:00", "duration_minutes": 30},
+            {}
+        ])
+        
+        assert tasks == [Task("Task 1", "10:00", 30), Task("Unnamed Task", "??:??", 0)]
+        assert tasks[0].duration == 30
+    
+    def test_wait_for_enter_times_out(self):
+        """Test that an unacknowledged alarm gives up after its timeout."""
+        from timer import _wait_for_enter
+        
+        with patch('timer._add_stdin_reader', return_value=True), \
+             patch('timer._remove_stdin_reader') as mock_remove:
+            assert asyncio.run(_wait_for_enter(0.01)) is False
+        mock_remove.assert_called_once()
+    
+    def test_drain_stdin_discards_all_pending_input(self):
+        """Test that one drain consumes every queued Enter press from a pipe."""
+        from timer import _drain_stdin
+        
+        read_fd, write_fd = os.pipe()
+        try:
+            os.write(write_fd, b"\n\n")
+            fake_stdin = MagicMock()
+            fake_stdin.fileno.return_value = read_fd
+            with patch('timer.sys.stdin', fake_stdin):
+                _drain_stdin()
+            
+            os.set_blocking(read_fd, False)
+            with pytest.raises(BlockingIOError):
+                os.read(read_fd, 1)
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+    
+    def test_drain_stdin_flushes_every_line_on_a_tty(self):
+        """Test that a terminal's queued lines are all dropped, not just the first."""
+        from timer import _drain_stdin
+        
+        controller_fd, terminal_fd = pty.openpty()
+        try:
+            os.write(controller_fd, b"\n\n\n")
+            fake_stdin = MagicMock()
+            fake_stdin.fileno.return_value = terminal_fd
+            with patch('timer.sys.stdin', fake_stdin):
+                _drain_stdin()
+            
+            os.set_blocking(terminal_fd, False)
+            with pytest.raises(BlockingIOError):
+                os.read(terminal_fd, 1)
+        finally:
+            os.close(controller_fd)
+            os.close(terminal_fd)
+    
+    def test_run_schedule_uses_precomputed_deadlines(self):
+        """Test that deadlines follow the day's plan, moving up only when a task is skipped."""
+        from timer import run_schedule, parse_tasks
+        
+        clock = [0.0]
+        deadlines = []
+        # Seconds past its deadline each fake task returns: a late alarm
+        # acknowledgement, an on-time finish, a skip 30 seconds early, then an
+        # invalid duration that returns at once
+        offsets = iter([5, 0, -30, 0, 0])
+        
+        async def fake_timer(*args, deadline, **kwargs):
+            deadlines.append(deadline)
+            clock[0] = deadline + next(offsets)
+            return 1
+        
+        tasks = [
+            {"task_name": "Task 1", "start_time": "10:00", "duration_minutes": 1},
+            {"task_name": "Task 2", "start_time": "10:01", "duration_minutes": 2},
+            {"task_name": "Task 3", "start_time": "10:03", "duration_minutes": 1},
+            {"task_name": "Broken", "start_time": "10:04", "duration_minutes": -1},
+            {"task_name": "Task 4", "start_time": "10:04", "duration_minutes": 1}
+        ]
+        with patch('timer.time.monotonic', side_effect=lambda: clock[0]), \
+             patch('timer.run_task_timer', side_effect=fake_timer), \
+             patch('timer.close_all_notifications'):
+            asyncio.run(run_schedule(parse_tasks(tasks)))
+        
+        # The late acknowledgement doesn't move Task 2; the skip moves Task 4 up,
+        # and the negative duration doesn't
+        assert deadlines == [60.0, 180.0, 240.0, 210.0, 270.0]
+    
+    def test_sigint_cancels_schedule_and_runs_cleanup(self):
+        """Test that Ctrl+C mid-task cancels the schedule and still runs its cleanup."""
+        from timer import run_until_interrupted
+        
+        cleaned_up = []
+        
+        async def fake_schedule(*args):
+            try:
+                signal.raise_signal(signal.SIGINT)
+                await asyncio.sleep(60)
+            finally:
+                cleaned_up.append(True)
+        
+        with patch('timer.run_schedule', side_effect=fake_schedule):
+            assert asyncio.run(run_until_interrupted([])) is False
+        
+        assert cleaned_up == [True]
+    
+    def test_countdown_writes_raw_bytes_to_tty(self):
+        """Test that the terminal countdown goes to stdout's byte stream on a tty."""
+        from timer import run_task_timer
+        
+        clock = [0.0]
+        
+        async def fake_wait(event, timeout):
+            clock[0] += timeout
+            return False
+        
+        fake_stdout = MagicMock()
+        fake_stdout.encoding = "utf-8"
+        fake_stdout.buffer = io.BytesIO()
+        with patch('timer.time.monotonic', side_effect=lambda: clock[0]), \
+             patch('timer._wait_for_event', side_effect=fake_wait), \
+             patch('timer._wait_for_enter', new_callable=AsyncMock), \
+             patch('timer.play_alarm'), \
+             patch('timer._IS_TTY', True), \
+             patch('timer.sys.stdout', fake_stdout):
+            asyncio.run(run_task_timer("Task 1", 1, "End of schedule!"))
+        
+        written = fake_stdout.buffer.getvalue()
+        assert written.startswith("\r⏳ 00:59 remaining".encode())
+        assert written.endswith(b"00:01 remaining")
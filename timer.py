@@ -18,11 +18,21 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-import json
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import signal
 import subprocess
 import time
 import sys
-import select
+import termios
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import accumulate
+from typing import NamedTuple
+
+import orjson
 
 try:
     import notify2
@@ -34,9 +44,108 @@ except ImportError:
 # --- CONFIGURATION ---
 # Path to a system sound for the alarm. This is a common one.
 ALARM_SOUND_PATH = "/usr/share/sounds/freedesktop/stereo/alarm-clock-elapsed.oga"
+# The live countdown line is redrawn with '\r', which is only worth doing on a terminal
+_IS_TTY = sys.stdout.isatty()
+# Seconds to wait for the alarm to be acknowledged before the next task starts anyway
+ALARM_ACK_TIMEOUT = 10.0
+
+# Urgencies and icons bound once at module level instead of looked up on notify2 per use
+_U_LOW, _U_NORMAL, _U_CRIT = notify2.URGENCY_LOW, notify2.URGENCY_NORMAL, notify2.URGENCY_CRITICAL
+_ICON_OK, _ICON_INFO, _ICON_SOON, _ICON_ALARM = (
+    "emblem-ok", "dialog-information", "appointment-soon", "dialog-warning"
+)
+
+# libcanberra event properties (see canberra.h)
+_CA_PROP_EVENT_ID = b"event.id"
+_CA_PROP_MEDIA_FILENAME = b"media.filename"
+ALARM_EVENT_ID = b"alarm-clock-elapsed"
+
+# (library, context) once loaded; False if libcanberra isn't usable
+_canberra = None
+
+def _get_canberra():
+    """
+    Open one libcanberra context on first use and pre-decode the alarm sample.
+    Returns None if libcanberra isn't installed, so callers can fall back to paplay.
+    """
+    global _canberra
+    if _canberra is None:
+        _canberra = False
+        try:
+            lib = ctypes.CDLL(ctypes.util.find_library("canberra") or "libcanberra.so.0")
+        except OSError:
+            return None
+        ctx = ctypes.c_void_p()
+        if lib.ca_context_create(ctypes.byref(ctx)) != 0:
+            return None
+        lib.ca_context_cache(
+            ctx,
+            _CA_PROP_EVENT_ID, ALARM_EVENT_ID,
+            _CA_PROP_MEDIA_FILENAME, ALARM_SOUND_PATH.encode(),
+            None
+        )
+        _canberra = (lib, ctx)
+    return _canberra or None
+
+# Raw format the alarm is decoded to for the persistent paplay stream
+_PCM_RATE = 44100
+_PCM_CHANNELS = 2
+
+# (paplay process, decoded alarm) once started; False if sox or paplay is missing
+_paplay_stream = None
+
+def _get_paplay_stream():
+    """
+    Decode the alarm to raw PCM with sox once and start one long-lived
+    `paplay --raw` reading from a pipe. Returns None if either tool is missing.
+    """
+    global _paplay_stream
+    if _paplay_stream is None:
+        _paplay_stream = False
+        try:
+            pcm = subprocess.check_output(
+                ["sox", ALARM_SOUND_PATH, "-t", "raw", "-r", str(_PCM_RATE),
+                 "-e", "signed", "-b", "16", "-L", "-c", str(_PCM_CHANNELS), "-"],
+                stderr=subprocess.DEVNULL
+            )
+            proc = subprocess.Popen(
+                ["paplay", "--raw", f"--rate={_PCM_RATE}", "--format=s16le",
+                 f"--channels={_PCM_CHANNELS}"],
+                stdin=subprocess.PIPE
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        _paplay_stream = (proc, pcm)
+    return _paplay_stream or None
 
 def play_alarm():
-    """Plays the alarm sound using paplay."""
+    """
+    Plays the alarm sound through libcanberra, falling back to a persistent
+    paplay stream and then a one-off paplay. May block while the sound is
+    written to the stream, so call it off the event loop.
+    """
+    global _paplay_stream
+    canberra = _get_canberra()
+    if canberra:
+        lib, ctx = canberra
+        # Plays asynchronously on the already-open PulseAudio connection
+        if lib.ca_context_play(
+            ctx, 0,
+            _CA_PROP_EVENT_ID, ALARM_EVENT_ID,
+            _CA_PROP_MEDIA_FILENAME, ALARM_SOUND_PATH.encode(),
+            None
+        ) == 0:
+            return
+    stream = _get_paplay_stream()
+    if stream:
+        proc, pcm = stream
+        try:
+            proc.stdin.write(pcm)
+            proc.stdin.flush()
+            return
+        except (OSError, ValueError):
+            # paplay went away; start a fresh stream next time
+            _paplay_stream = None
     try:
         # Use Popen to play sound in the background without blocking
         subprocess.Popen(["paplay", ALARM_SOUND_PATH])
@@ -46,18 +155,30 @@ def play_alarm():
 
 def close_all_notifications():
     """
-    Force-close all notifications using dunstctl.
+    Force-close all notifications, asking dunst directly over D-Bus.
     This actually removes notifications from the screen, unlike notify2.close()
+    Falls back to dunstctl if the D-Bus call isn't available.
     """
+    try:
+        # Same call dunstctl makes, on notify2's existing session bus connection.
+        # It returns once dunst has handled it, so no settle delay is needed.
+        notify2.dbus_iface.get_dbus_method(
+            "NotificationCloseAll", "org.dunstproject.cmd0"
+        )()
+        return True
+    except Exception:
+        # Not initialized, or the daemon isn't dunst - try dunstctl instead
+        pass
     try:
         # Try to close all notifications via dunstctl
         result = subprocess.run(
             ["dunstctl", "close-all"],
-            capture_output=True,
+            # Only the return code matters, so don't set up pipes to collect output
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
             timeout=1
         )
         if result.returncode == 0:
-            time.sleep(0.1)  # Give dunst time to process
             return True
     except (FileNotFoundError, subprocess.TimeoutExpired):
         # dunstctl not available or timed out - that's okay
@@ -67,35 +188,52 @@ def close_all_notifications():
         pass
     return False
 
+class Task(NamedTuple):
+    """One task from the schedule, with its defaults already filled in."""
+    name: str
+    start: str
+    duration: int
+
+def parse_tasks(tasks):
+    """
+    Turn the schedule's task dicts into Task records, once.
+    Everything downstream reads attributes instead of probing dicts with .get().
+    """
+    return [
+        Task(
+            task.get("task_name", "Unnamed Task"),
+            task.get("start_time", "??:??"),
+            task.get("duration_minutes", 0)
+        )
+        for task in tasks
+    ]
+
 def queue_timeline_notifications(tasks, current_index=0):
     """
     Queue all tasks for the day as a sequence of notifications.
     This creates a timeline view that persists while the timer runs.
     
     Args:
-        tasks: List of all tasks in the schedule
+        tasks: List of Task records from parse_tasks()
         current_index: Index of the currently active task
     """
     timeline_notifications = []
     
-    for i, task in enumerate(tasks):
-        task_name = task.get("task_name", "Unnamed Task")
-        start_time = task.get("start_time", "??:??")
-        duration = task.get("duration_minutes", 0)
+    for i, (task_name, start_time, duration) in enumerate(tasks):
         
         # Determine status
         if i < current_index:
             status = "✅ Completed"
-            icon = "emblem-ok"
-            urgency = notify2.URGENCY_LOW
+            icon = _ICON_OK
+            urgency = _U_LOW
         elif i == current_index:
             status = "⏳ Active Now"
-            icon = "dialog-information"
-            urgency = notify2.URGENCY_CRITICAL
+            icon = _ICON_INFO
+            urgency = _U_CRIT
         else:
             status = "📅 Upcoming"
-            icon = "appointment-soon"
-            urgency = notify2.URGENCY_NORMAL
+            icon = _ICON_SOON
+            urgency = _U_NORMAL
         
         # Create timeline notification
         timeline_notif = notify2.Notification(
@@ -115,60 +253,158 @@ def queue_timeline_notifications(tasks, current_index=0):
         except AttributeError:
             pass
         
+        # No delay between shows: calls on one D-Bus connection reach the daemon in
+        # the order they were sent, so the timeline still stacks in task order
         timeline_notif.show()
         timeline_notifications.append(timeline_notif)
-        
-        # Small delay between notifications to prevent overwhelming the daemon
-        time.sleep(0.1)
     
     return timeline_notifications
 
-def update_timeline_notification(tasks, completed_index):
+def update_timeline_notification(timeline_notifications, tasks, completed_index):
     """
     Update a specific timeline notification to mark it as completed.
     This is called when a task finishes.
+    
+    Args:
+        timeline_notifications: Notifications returned by queue_timeline_notifications()
+        tasks: List of Task records from parse_tasks()
+        completed_index: Index of the task that just finished
     """
-    if completed_index >= len(tasks):
+    if completed_index >= len(timeline_notifications):
         return
     
+    # Re-show the task's existing notification so the daemon replaces it in place
     task = tasks[completed_index]
-    task_name = task.get("task_name", "Unnamed Task")
-    start_time = task.get("start_time", "??:??")
-    duration = task.get("duration_minutes", 0)
-    
-    # Create updated notification for completed task
-    completed_notif = notify2.Notification(
-        f"✅ Completed: {task_name}",
-        f"Time: {start_time} | Duration: {duration} min",
-        icon="emblem-ok"
+    completed_notif = timeline_notifications[completed_index]
+    completed_notif.update(
+        f"✅ Completed: {task.name}",
+        f"Time: {task.start} | Duration: {task.duration} min",
+        icon=_ICON_OK
     )
-    completed_notif.set_urgency(notify2.URGENCY_LOW)
-    completed_notif.set_timeout(0)
-    
+    completed_notif.set_urgency(_U_LOW)
+    completed_notif.show()
+
+# All notify2 (D-Bus) calls run on this one worker thread: they stay in order, and a
+# slow notification daemon can't stall the event loop that keeps the countdown on time.
+_dbus_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dbus")
+
+async def _in_dbus_thread(func, *args):
+    """Run a blocking notify2 call on the D-Bus worker thread."""
+    return await asyncio.get_running_loop().run_in_executor(_dbus_executor, func, *args)
+
+# One timer notification, created on first use and reused for every task
+_active_notif = None
+
+def _get_active_notification():
+    """Return the shared timer notification, creating it on first use."""
+    global _active_notif
+    if _active_notif is None:
+        _active_notif = notify2.Notification("", "", icon=_ICON_INFO)
+        _active_notif.set_urgency(_U_CRIT)
+        # Set timeout to 0 (never expire) so we control when it closes
+        _active_notif.set_timeout(0)
+        # Use a consistent stack tag so the timer notification replaces itself
+        # instead of stacking
+        try:
+            _active_notif.set_hint("x-dunst-stack-tag", "task-timer")
+        except AttributeError:
+            # Some notification daemons don't support hints, that's okay
+            pass
+    return _active_notif
+
+def _show(notification, title, body):
+    """Update a notification's text and re-send it to the daemon."""
+    notification.update(title, body)
+    notification.show()
+
+def _add_stdin_reader(loop, callback):
+    """
+    Call callback whenever stdin becomes readable.
+    Returns False if stdin can't be watched (e.g. it is redirected from a file).
+    """
     try:
-        # Use the same stack tag to replace the old notification
-        completed_notif.set_hint("x-dunst-stack-tag", f"timeline-{completed_index}")
-        completed_notif.set_hint("x-dunst-replace-id", completed_index)
-    except AttributeError:
+        loop.add_reader(sys.stdin.fileno(), callback)
+    except (OSError, ValueError):
+        return False
+    return True
+
+def _remove_stdin_reader(loop):
+    loop.remove_reader(sys.stdin.fileno())
+
+def _drain_stdin():
+    """
+    Discard everything waiting on stdin, bypassing the buffered text layer.
+    Extra Enter presses go too, so they can't skip the next task.
+    """
+    fd = sys.stdin.fileno()
+    if os.isatty(fd):
+        # A canonical-mode tty hands back one line per read(), so drop the whole
+        # input queue in one go instead
+        termios.tcflush(fd, termios.TCIFLUSH)
+        return
+    # Non-blocking only while draining: the descriptor may be shared with
+    # stdout, which should stay blocking
+    was_blocking = os.get_blocking(fd)
+    os.set_blocking(fd, False)
+    try:
+        while os.read(fd, 4096):
+            pass
+    except BlockingIOError:
+        # Everything queued has been read
         pass
-    
-    completed_notif.show()
+    finally:
+        os.set_blocking(fd, was_blocking)
+
+async def _wait_for_event(event, timeout):
+    """Wait up to timeout seconds for event to be set; returns True if it was."""
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+async def _wait_for_enter(timeout=None):
+    """
+    Wait until the user presses Enter, without blocking the event loop.
+    Returns False if timeout seconds pass first (None waits indefinitely).
+    """
+    loop = asyncio.get_running_loop()
+    entered = asyncio.Event()
+    if not _add_stdin_reader(loop, entered.set):
+        # stdin can't be polled; fall back to a blocking read off the loop
+        try:
+            await asyncio.wait_for(loop.run_in_executor(None, sys.stdin.readline), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+    try:
+        if not await _wait_for_event(entered, timeout):
+            return False
+    finally:
+        _remove_stdin_reader(loop)
+    _drain_stdin()
+    return True
 
-def run_task_timer(task, next_task_info, notification_id=None):
+async def run_task_timer(task_name, duration_minutes, next_task_info, notification_id=None,
+                         on_finish=None, deadline=None):
     """
     Handles the countdown logic for a single task using the notify2 library.
     Now allows skipping the current task by pressing Enter.
     
     Args:
-        task: Dictionary containing task information
+        task_name: Name of the task
+        duration_minutes: Length of the task in minutes
         next_task_info: String describing the next task
         notification_id: Optional persistent ID for notification replacement
+        on_finish: Optional blocking notify2 call to make as soon as the countdown
+            ends; it runs on the D-Bus thread while the alarm waits to be acknowledged
+        deadline: Optional time.monotonic() value the countdown ends at; defaults to
+            duration_minutes from now
     """
-    task_name = task.get("task_name", "Unnamed Task")
-    duration_minutes = task.get("duration_minutes", 0)
-    
     if duration_minutes <= 0:
         print(f"Skipping task '{task_name}' with invalid duration.")
+        if on_finish:
+            await _in_dbus_thread(on_finish)
         return None
 
     remaining_seconds = duration_minutes * 60
@@ -185,70 +421,95 @@ def run_task_timer(task, next_task_info, notification_id=None):
     # Don't close timeline notifications - they should persist
     # Replacement IDs ensure the active timer notification replaces itself
     
-    notification = notify2.Notification(
-        f"Starting Task: {task_name}",
-        f"Time remaining: {duration_minutes:02d}:00\nNext: {next_task_info}",
-        icon="dialog-information"
-    )
-    notification.set_urgency(notify2.URGENCY_CRITICAL)
-    # Set timeout to 0 (never expire) so we control when it closes
-    notification.set_timeout(0)
-    # Use replacement hint to replace previous notifications with same ID
-    # This makes notifications replace each other instead of stacking
+    notification = _get_active_notification()
+    # The title never changes during a task
+    title = f"Current Task: {task_name}"
     try:
-        # Use a consistent replacement ID so notifications replace each other
-        notification.set_hint("x-dunst-stack-tag", "task-timer")
         notification.set_hint("x-dunst-replace-id", notification_id)
     except AttributeError:
-        # Some notification daemons don't support hints, that's okay
         pass
-    notification.show()
-    # Small delay to ensure notification is processed
-    time.sleep(0.1)
+    await _in_dbus_thread(
+        _show,
+        notification,
+        f"Starting Task: {task_name}",
+        f"Time remaining: {duration_minutes:02d}:00\nNext: {next_task_info}"
+    )
 
     alarm_notification = None
     task_skipped = False  # Track if task was skipped early
     
+    # Count down against a fixed monotonic deadline rather than decrementing once per
+    # wakeup, so time spent in D-Bus calls doesn't make each "second" longer.
+    if deadline is None:
+        deadline = time.monotonic() + remaining_seconds
+    else:
+        remaining_seconds = max(0, round(deadline - time.monotonic()))
+    last_shown = remaining_seconds
+
+    # Every body and terminal line this countdown can show, indexed by seconds left,
+    # so a tick is a lookup rather than divmod plus string formatting
+    body_tpl = "<b>%02d:%02d remaining</b>\nNext: " + next_task_info.replace("%", "%%")
+    countdown = [divmod(r, 60) for r in range(remaining_seconds + 1)]
+    bodies = [body_tpl % mm_ss for mm_ss in countdown]
+    lines = None
+    if _IS_TTY:
+        # Terminal lines are encoded up front and written straight to the byte
+        # stream, bypassing the TextIO layer; nothing is written when stdout isn't a tty
+        encoding = sys.stdout.encoding or "utf-8"
+        lines = [
+            ("\r⏳ %02d:%02d remaining" % mm_ss).encode(encoding, "replace")
+            for mm_ss in countdown
+        ]
+        out = sys.stdout.buffer
+        # Anything still buffered as text has to go out before the raw writes
+        sys.stdout.flush()
+
+    # Pressing Enter sets this event from the event loop's stdin reader
+    loop = asyncio.get_running_loop()
+    enter_pressed = asyncio.Event()
+    watching_stdin = _add_stdin_reader(loop, enter_pressed.set)
+
     try:
-        while remaining_seconds > 0:
-            # Use select to wait for 1 second OR for user input
-            ready_to_read, _, _ = select.select([sys.stdin], [], [], 1)
+        while True:
+            # Sleep until the displayed mm:ss next changes, OR until user input arrives
+            timeout = max(0.0, deadline - (remaining_seconds - 1) - time.monotonic())
             
-            if ready_to_read:
+            if await _wait_for_event(enter_pressed, timeout):
                 print("\n⏩ Skipping to the next task!")
                 # Consume the input from the buffer
-                sys.stdin.readline()
+                _drain_stdin()
                 # Mark that task was skipped
                 task_skipped = True
-                # Close the notification object (replacement IDs will handle screen cleanup)
-                notification.close()
-                # Give the daemon time to process
-                time.sleep(0.2)
-                break # Exit the countdown loop
-
-            remaining_seconds -= 1
-            mins, secs = divmod(remaining_seconds, 60)
-            countdown_str = f"{mins:02d}:{secs:02d} remaining"
-            
+                break # Exit the countdown loop (the finally block closes the notification)
+
+            remaining_seconds = max(0, round(deadline - time.monotonic()))
+            if remaining_seconds <= 0:
+                break
+            # If we fell behind, missed ticks are coalesced into this one update
+            if remaining_seconds == last_shown:
+                continue
+            last_shown = remaining_seconds
+
             # Update the single notification object in place
-            notification.update(
-                f"Current Task: {task_name}",
-                f"<b>{countdown_str}</b>\nNext: {next_task_info}"
-            )
-            notification.show()
+            await _in_dbus_thread(_show, notification, title, bodies[remaining_seconds])
             
-            # Use carriage return '\r' to print on the same line
-            print(f"\r⏳ {countdown_str}", end="")
+            # Use carriage return '\r' to print on the same line (only useful on a terminal)
+            if lines:
+                out.write(lines[remaining_seconds])
+                out.flush()
             
     finally:
         # This block ALWAYS runs, even if you press Ctrl+C or skip early.
         # This guarantees the notification is closed cleanly.
+        if watching_stdin:
+            _remove_stdin_reader(loop)
         if notification:
             # Close the notification object
-            # Replacement IDs will ensure the next active timer replaces this one
-            notification.close()
-            # Give the daemon time to process the close before creating new notification
-            time.sleep(0.2)
+            # Replacement IDs will ensure the next active timer replaces this one.
+            # No settle delay: the next show() is queued behind it on the D-Bus thread
+            await _in_dbus_thread(notification.close)
+
+    finishing = asyncio.ensure_future(_in_dbus_thread(on_finish)) if on_finish else None
 
     # Only show alarm if task completed normally (not skipped)
     if not task_skipped:
@@ -259,33 +520,133 @@ def run_task_timer(task, next_task_info, notification_id=None):
         final_body = f"Take a break! \nNext up is: {next_task_info}"
         
         alarm_notification = notify2.Notification(
-            final_title, final_body, icon="dialog-warning"
+            final_title, final_body, icon=_ICON_ALARM
         )
-        alarm_notification.set_urgency(notify2.URGENCY_CRITICAL)
-        # Set a timeout for the alarm notification (10 seconds)
-        alarm_notification.set_timeout(10000)
+        alarm_notification.set_urgency(_U_CRIT)
+        # The alarm notification expires when the next task starts by itself
+        alarm_notification.set_timeout(int(ALARM_ACK_TIMEOUT * 1000))
         # Use a different ID for alarm notifications
         try:
             alarm_notification.set_hint("x-dunst-stack-tag", f"alarm-{notification_id}")
         except AttributeError:
             pass
-        alarm_notification.show()
+        await _in_dbus_thread(alarm_notification.show)
 
-        play_alarm()
+        # Off the event loop: writing the sound to the paplay stream can block
+        loop.run_in_executor(None, play_alarm)
         
-        input("🚨 ALARM! Press Enter to stop the alarm and start the next task...")
+        print(
+            "🚨 ALARM! Press Enter to stop the alarm and start the next task "
+            f"(starts by itself in {ALARM_ACK_TIMEOUT:g}s)...",
+            end="", flush=True
+        )
+        if not await _wait_for_enter(ALARM_ACK_TIMEOUT):
+            # Nobody acknowledged: end the prompt line and let the schedule move on
+            print()
         
         # Close the alarm notification before starting the next task
         # Alarm notifications use a different stack tag, so closing is safe
         if alarm_notification:
             # Close the alarm - it uses a different stack tag so won't affect timeline
-            alarm_notification.close()
-            # Give the daemon time to process before next notification
-            time.sleep(0.2)
+            await _in_dbus_thread(alarm_notification.close)
     
+    if finishing:
+        await finishing
     return notification_id + 1
 
 
+async def run_schedule(tasks):
+    """Run every task's timer in order on a single event loop."""
+    # Clear any pre-existing notifications at startup (except our timeline)
+    # This ensures our timer notifications appear on top
+    print("Clearing any pre-existing notifications...")
+    await _in_dbus_thread(close_all_notifications)
+
+    # Queue all tasks as timeline notifications at startup
+    # This creates a persistent sequence showing the day's schedule.
+    # It runs in the background: the D-Bus thread still sends these before the
+    # first timer's notification, but the countdown doesn't wait for them.
+    print("Queueing timeline notifications for today's schedule...")
+    timeline_queued = _dbus_executor.submit(
+        queue_timeline_notifications, tasks, 0
+    )
+
+    def mark_completed(index):
+        # Runs on the D-Bus thread after the queueing job, so its result is ready
+        update_timeline_notification(timeline_queued.result(), tasks, index)
+
+    # Track notification ID to ensure proper replacement
+    notification_id = 0
+    
+    # The whole day's end times, fixed up front on the monotonic clock so neither
+    # per-task overhead nor a slow alarm acknowledgement pushes later tasks back;
+    # time spent on the alarm comes out of the next task instead
+    # Tasks with an invalid (<= 0) duration are skipped, so they add no time
+    deadlines = list(accumulate(
+        (max(task.duration, 0) * 60 for task in tasks), initial=time.monotonic()
+    ))[1:]
+    # How far the day has been pulled forward by skipping tasks early
+    shift = 0.0
+    
+    try:
+        for i, task in enumerate(tasks):
+            if i + 1 < len(tasks):
+                next_task = tasks[i + 1]
+                next_task_info = f"'{next_task.name}' ({next_task.duration} min)"
+            else:
+                next_task_info = "End of schedule!"
+            
+            # The task is marked completed in the timeline once, during its alarm
+            deadline = deadlines[i] + shift
+            notification_id = await run_task_timer(
+                task.name, task.duration, next_task_info, notification_id,
+                on_finish=partial(mark_completed, i),
+                deadline=deadline
+            )
+            ended = time.monotonic()
+            if ended < deadline:
+                # Skipped early: the rest of the day moves up by the time saved
+                shift = ended - deadlines[i]
+    finally:
+        timeline_queued.cancel()
+
+    print("\n---\n🎉 All tasks completed! Great work. ---")
+    
+    # The active timer notification is already closed via notify2.close()
+    # Timeline notifications persist to show the completed schedule
+    
+    final_notification = notify2.Notification(
+        "Schedule Finished!", "All tasks for today are complete.", icon=_ICON_OK
+    )
+    final_notification.set_urgency(_U_CRIT)
+    final_notification.set_timeout(5000)  # 5 second timeout
+    await _in_dbus_thread(final_notification.show)
+
+
+async def run_until_interrupted(tasks):
+    """
+    Run the schedule, cancelling it on Ctrl+C or SIGTERM.
+    The event loop wakes on the signal right away (through its wakeup fd) even
+    mid-countdown, and cancelling runs every finally block, so the timer
+    notification is always closed.
+    
+    Returns:
+        True if the schedule finished, False if it was interrupted
+    """
+    loop = asyncio.get_running_loop()
+    schedule = asyncio.ensure_future(run_schedule(tasks))
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, schedule.cancel)
+    try:
+        await schedule
+    except asyncio.CancelledError:
+        return False
+    finally:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
+    return True
+
+
 def main():
     """Main function to load schedule and run the timers."""
     if len(sys.argv) < 2:
@@ -303,12 +664,12 @@ def main():
         sys.exit(1)
 
     try:
-        with open(schedule_file, 'r') as f:
-            schedule = json.load(f)
+        with open(schedule_file, 'rb') as f:
+            schedule = orjson.loads(f.read())
     except FileNotFoundError:
         print(f"Error: The file '{schedule_file}' was not found.")
         sys.exit(1)
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         print(f"Error: The file '{schedule_file}' is not a valid JSON file.")
         sys.exit(1)
 
@@ -320,62 +681,15 @@ def main():
     print(f"Loaded schedule for {schedule.get('schedule_date', 'today')}.")
     print("Press Ctrl+C to exit at any time for a clean shutdown.")
 
-    # Clear any pre-existing notifications at startup (except our timeline)
-    # This ensures our timer notifications appear on top
-    print("Clearing any pre-existing notifications...")
-    close_all_notifications()
-    time.sleep(0.3)
-
-    # Queue all tasks as timeline notifications at startup
-    # This creates a persistent sequence showing the day's schedule
-    print("Queueing timeline notifications for today's schedule...")
-    timeline_notifications = queue_timeline_notifications(tasks, current_index=0)
-    time.sleep(0.5)  # Give time for all timeline notifications to appear
-
-    # Track notification ID to ensure proper replacement
-    notification_id = 0
-    
     try:
-        for i, task in enumerate(tasks):
-            if i + 1 < len(tasks):
-                next_task = tasks[i + 1]
-                next_name = next_task.get('task_name', 'Unnamed')
-                next_dur = next_task.get('duration_minutes', 0)
-                next_task_info = f"'{next_name}' ({next_dur} min)"
-            else:
-                next_task_info = "End of schedule!"
-            
-            # Update timeline to mark current task as active
-            if i > 0:
-                # Mark previous task as completed in timeline
-                update_timeline_notification(tasks, i - 1)
-            
-            notification_id = run_task_timer(task, next_task_info, notification_id)
-            
-            # After task completes, update timeline
-            update_timeline_notification(tasks, i)
+        completed = asyncio.run(run_until_interrupted(parse_tasks(tasks)))
     except KeyboardInterrupt:
-        # This catches Ctrl+C if it's pressed between tasks.
+        # Ctrl+C outside the schedule itself (e.g. while the loop starts up)
+        completed = False
+    if not completed:
         print("\n\nTimer stopped by user. Exiting gracefully.")
         sys.exit(0)
 
-    print("\n---\n🎉 All tasks completed! Great work. ---")
-    
-    # Mark the last task as completed in timeline
-    if tasks:
-        update_timeline_notification(tasks, len(tasks) - 1)
-    
-    # The active timer notification is already closed via notify2.close()
-    # Timeline notifications persist to show the completed schedule
-    time.sleep(0.3)
-    
-    final_notification = notify2.Notification(
-        "Schedule Finished!", "All tasks for today are complete.", icon="emblem-ok"
-    )
-    final_notification.set_urgency(notify2.URGENCY_CRITICAL)
-    final_notification.set_timeout(5000)  # 5 second timeout
-    final_notification.show()
-
 
 if __name__ == "__main__":
     main()